@@ -1,20 +1,24 @@
+import sys
 import asyncio
-import os
 import time
-import csv
-import json
-import random
+import logging
+import itertools
+import functools
 from datetime import datetime, timedelta
-from configparser import ConfigParser
-from twikit import Client, TooManyRequests
+from scraper import core
+from scraper.core import rate_limiter
 
-# Configuration
-COOKIES_FILE = 'cookies.json'
+# Configuration (login, search, checkpoint and CSV handling live in scraper/core.py)
 CHECKPOINT_FILE = 'checkpoint.json'
 TWEETS_FILE = 'tweets_large_4.csv'
 QUERY = '(ثمانية OR ثمانيه)'
 MAX_TWEETS = 1000
 BATCH_SIZE = 20
+QUERY_VARIATIONS = 8  # see generate_query_variations
+CONCURRENCY = 8  # searches in flight at once across all streams
+MAX_CONSECUTIVE_FAILURES = 20
+FAILURE_BACKOFF = 60  # seconds per consecutive failure before a failed search is retried
+CHECKPOINT_EVERY = 10  # batches between checkpoint writes (always saved on exit)
 
 # Define different search strategies
 SEARCH_STRATEGIES = [
@@ -22,270 +26,216 @@ SEARCH_STRATEGIES = [
     {'product': 'Top', 'count': BATCH_SIZE},
 ]
 
-async def check_cookies_valid(client):
-    """Check if loaded cookies are still valid"""
-    try:
-        await client.get_trends('trending')
-        return True
-    except Exception:
-        return False
+# Query variations that don't depend on the date, built once at import
+_STATIC_VARIATIONS = (
+    QUERY,
+    QUERY.replace('(to:thmanyahCompany)', ''),
+    QUERY.replace('(ثمانية OR ثمانيه)', 'ثمانية'),
+    QUERY.replace('(ثمانية OR ثمانيه)', 'ثمانيه'),
+    QUERY.replace('lang:ar', ''),
+)
 
-async def safe_search(client, query, product='Latest', count=20, cursor=None):
-    """Perform a search with rate limit handling"""
-    try:
-        result = await client.search_tweet(query, product, count=count, cursor=cursor)
-        return result
-    except TooManyRequests as e:
-        reset_time = getattr(e, 'rate_limit_reset', time.time() + 900)
-        wait_time = max(reset_time - time.time(), 0) + 10
-        print(f"Rate limited. Waiting {wait_time:.0f} seconds until {datetime.fromtimestamp(reset_time)}")
-        await asyncio.sleep(wait_time)
-        return await safe_search(client, query, product, count, cursor)
-    except Exception as e:
-        print(f"Search error: {e}")
-        await asyncio.sleep(60)
-        return None
+@functools.lru_cache(maxsize=1)
+def _date_variations(hour):
+    """Date-based variations; the cache key is the current hour, so they're rebuilt at most hourly"""
+    current_date = datetime.now()
+    return tuple(
+        f"{QUERY} since:{current_date - timedelta(days=days):%Y-%m-%d}"
+        for days in (30, 60, 90)
+    )
 
-def load_checkpoint():
-    """Load progress from checkpoint file"""
-    if os.path.exists(CHECKPOINT_FILE):
-        try:
-            with open(CHECKPOINT_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            pass
-    return {
-        'count': 0, 
-        'cursor': None, 
-        'strategy_index': 0,
-        'last_successful_strategy': 0,
-        'consecutive_failures': 0,
-        'last_success_time': None,
-        'query_variations': 0
-    }
+def generate_query_variations(variation_index):
+    """Pick a variation of QUERY to find more results (cycles through them)"""
+    variations = _STATIC_VARIATIONS + _date_variations(int(time.time() // 3600))
+    return variations[variation_index % len(variations)]
 
-def save_checkpoint(data):
-    """Save progress to checkpoint file"""
-    with open(CHECKPOINT_FILE, 'w') as f:
-        json.dump(data, f)
+def stream_key(query, strategy):
+    """Checkpoint key of a stream's cursor: one per distinct (query, product) pair"""
+    return f"{core.query_hash(query)}|{strategy['product']}"
 
-def save_tweets_batch(tweets, writer, existing_ids):
-    """Save a batch of tweets to CSV, avoiding duplicates"""
-    new_count = 0
-    for tweet in tweets:
-        if tweet.id not in existing_ids:
-            writer.writerow([
-                tweet.id,
-                f"@{tweet.user.screen_name}",
-                tweet.text,
-                tweet.created_at,
-                tweet.retweet_count,
-                tweet.favorite_count,
-                tweet.reply_count
-            ])
-            existing_ids.add(tweet.id)
-            new_count += 1
-    return new_count
+async def pause(stop, delay):
+    """Sleep for delay seconds, waking early once the run is stopping"""
+    try:
+        await asyncio.wait_for(stop.wait(), delay)
+    except asyncio.TimeoutError:
+        pass
 
-async def main():
-    """Main async function to handle Twitter login and operations"""
-    client = Client(language='ar')
+async def search_stream(client, sem, queue, stop, state, query, strategy):
+    """Page through one (query, strategy) pair and hand each batch to the writer"""
+    key = stream_key(query, strategy)
+    saved = state['cursors'].get(key, {})  # resume mid-stream from the last run
+    cursor = saved.get('cursor')
+    page = saved.get('page', 0)
+    resumed = cursor is not None
     
-    if os.path.exists(COOKIES_FILE):
+    while not stop.is_set():
+        print(f"Searching. Strategy: {strategy['product']}, Query: {query[:50]}...")
+        
+        async with sem:
+            result = await core.safe_search(client, query, strategy['product'], strategy['count'], cursor)
+        
+        if result is None:
+            # every retry failed (429 storm, network outage): keep the cursor and retry the
+            # same page after a backoff; only a real empty page means the cursor went stale
+            state['consecutive_failures'] += 1
+            print(f"Search failed for strategy {strategy['product']}. Consecutive failures: {state['consecutive_failures']}")
+            if state['consecutive_failures'] >= MAX_CONSECUTIVE_FAILURES:
+                stop.set()
+                return
+            await pause(stop, FAILURE_BACKOFF * state['consecutive_failures'])
+            continue
+        
+        tweets = list(result)
+        if not tweets and resumed:
+            # A checkpointed cursor can go stale (expired, or the tweets around it deleted)
+            # and then only ever returns empty pages: recover once from the first page
+            # instead of counting it toward the kill-switch
+            print(f"Saved cursor for strategy {strategy['product']} (page {page}) returned nothing. Restarting from the first page")
+            cursor, page, resumed = None, 0, False
+            continue
+        resumed = False
+        if not tweets:
+            state['consecutive_failures'] += 1
+            print(f"No tweets for strategy {strategy['product']}. Consecutive failures: {state['consecutive_failures']}")
+            if state['consecutive_failures'] >= MAX_CONSECUTIVE_FAILURES:
+                stop.set()
+            return
+        
+        cursor = result.next_cursor
+        page += 1
+        # the writer records the cursor with the page; its checkpoint is queued behind the
+        # page's rows, so a resume never skips it
+        await queue.put((tweets, key, cursor, page))
+        
+        if not cursor:
+            print(f"No more pages for strategy {strategy['product']}, Query: {query[:50]}...")
+            return
+        
+        # Avoid rate limiting - each stream paces itself from the last search's rate-limit
+        # headers (acquire() spaces the streams out), the semaphore caps the overlap
+        await pause(stop, rate_limiter.pace((30, 90)))
+
+async def write_batches(queue, out, existing_ids, state, stop):
+    """Single consumer of the search streams, so CSV rows and the checkpoint never interleave
+
+    The disk work is queued on out, a core.QueuedWriter that applies it in a worker thread,
+    so a slow disk doesn't hold up the streams' searches on the event loop. Nothing here
+    waits on a thread, so the task can be cancelled at any point.
+    """
+    batches_since_checkpoint = 0
+    while True:
+        tweets, key, cursor, page = await queue.get()
         try:
-            client.load_cookies(COOKIES_FILE)
-            print("✓ Loaded existing cookies")
-            if await check_cookies_valid(client):
-                print("✓ Cookies are valid")
-                return client
+            await out.wait_for_room()  # a stalled disk holds the streams back through the full queue
+            new_count = core.save_tweets_batch(tweets, out, existing_ids)
+            if cursor:
+                state['cursors'][key] = {'cursor': cursor, 'page': page}
             else:
-                print("✗ Cookies are expired")
+                state['cursors'].pop(key, None)  # exhausted: start over from the newest next run
+            if new_count > 0:
+                state['count'] += new_count
+                state['consecutive_failures'] = 0
+                state['last_success_time'] = datetime.now().isoformat()
+            else:
+                state['consecutive_failures'] += 1
+            
+            print(f"Added {new_count} new tweets. Total: {state['count']}/{MAX_TWEETS}")
+            
+            # Checkpoint every few batches; run_all_operations saves the final state
+            batches_since_checkpoint += 1
+            if batches_since_checkpoint >= CHECKPOINT_EVERY:
+                save_state(out, state)
+                batches_since_checkpoint = 0
+            
+            if out.failed:
+                print("Writing the CSV failed. Stopping")
+                stop.set()
+            if state['count'] >= MAX_TWEETS or state['consecutive_failures'] >= MAX_CONSECUTIVE_FAILURES:
+                stop.set()
         except Exception as e:
-            print(f"✗ Error loading cookies: {e}")
-    
-    config = ConfigParser()
-    config.read('config.ini')
-    
-    try:
-        username = config['X']['username']
-        email = config['X']['email']
-        password = config['X']['password']
-    except KeyError as e:
-        print(f"✗ Missing configuration: {e}")
-        return None
-    
-    try:
-        print("Logging in...")
-        await client.login(
-            auth_info_1=username,
-            auth_info_2=email, 
-            password=password
-        )
-        client.save_cookies(COOKIES_FILE)
-        print("✓ Successfully logged in and saved cookies")
-        return client
-    except Exception as e:
-        print(f"✗ Login failed: {e}")
-        return None
+            print(f"Error writing batch: {e}")
+            stop.set()
+        finally:
+            queue.task_done()
 
-def generate_query_variations(base_query, variation_index):
-    """Generate different variations of the query to find more results"""
-    variations = [
-        base_query,
-        base_query.replace('(to:thmanyahCompany)', ''),
-        base_query.replace('(ثمانية OR ثمانيه)', 'ثمانية'),
-        base_query.replace('(ثمانية OR ثمانيه)', 'ثمانيه'),
-        base_query.replace('lang:ar', ''),
-    ]
-    
-    # Add date-based variations
-    current_date = datetime.now()
-    date_variations = [
-        f"{base_query} since:{current_date - timedelta(days=30):%Y-%m-%d}",
-        f"{base_query} since:{current_date - timedelta(days=60):%Y-%m-%d}",
-        f"{base_query} since:{current_date - timedelta(days=90):%Y-%m-%d}",
-    ]
-    
-    variations.extend(date_variations)
-    
-    # Return the variation based on index (cycle through them)
-    return variations[variation_index % len(variations)]
+def save_state(out, state):
+    """Queue a CSV flush, then a snapshot of state (the streams keep updating the original)"""
+    out.flush()  # never checkpoint past tweets still sitting in the buffer
+    out.call(core.save_checkpoint, CHECKPOINT_FILE, dict(state, cursors=dict(state['cursors'])))
 
 async def run_all_operations():
     """Run all async operations within the same event loop"""
-    client = await main()
+    client = await core.init_client()
     
     if not client:
         print("Failed to initialize client")
         return
     
-    # Load checkpoint
-    checkpoint = load_checkpoint()
-    collected_count = checkpoint['count']
-    cursor = checkpoint.get('cursor')
-    strategy_index = checkpoint.get('strategy_index', 0)
-    last_successful_strategy = checkpoint.get('last_successful_strategy', 0)
-    consecutive_failures = checkpoint.get('consecutive_failures', 0)
-    last_success_time = checkpoint.get('last_success_time')
-    query_variations = checkpoint.get('query_variations', 0)
+    # Several variations collapse to the same string (e.g. when QUERY has no lang:ar to
+    # strip), so dedupe them; each distinct query runs once per strategy
+    queries = dict.fromkeys(generate_query_variations(i) for i in range(QUERY_VARIATIONS))
+    pairs = list(itertools.product(queries, SEARCH_STRATEGIES))
+    
+    # Load checkpoint; cursors of streams that no longer exist (dated variations roll
+    # over daily, or QUERY was edited: the key embeds the query hash) are dropped
+    checkpoint = core.load_checkpoint(CHECKPOINT_FILE, {
+        'count': 0, 
+        'consecutive_failures': 0,
+        'last_success_time': None,
+        'cursors': {},
+    })
+    saved_cursors = {
+        key: {'cursor': saved} if isinstance(saved, str) else saved  # bare cursors from older checkpoints
+        for key, saved in (checkpoint.get('cursors') or {}).items()
+    }
+    state = {
+        'count': checkpoint['count'],
+        'consecutive_failures': 0,
+        'last_success_time': checkpoint.get('last_success_time'),
+        'cursors': {
+            key: saved_cursors[key]
+            for key in (stream_key(query, strategy) for query, strategy in pairs)
+            if saved_cursors.get(key)
+        },
+    }
     
     # Load existing tweet IDs to avoid duplicates
-    existing_ids = set()
-    if os.path.exists(TWEETS_FILE):
-        with open(TWEETS_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            next(reader, None)
-            for row in reader:
-                if row:
-                    existing_ids.add(row[0])
+    existing_ids = core.init_existing_ids(TWEETS_FILE)
     
-    # Open CSV file for appending
-    with open(TWEETS_FILE, 'a', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
+    # Open CSV file for appending (the header is written when the file is new)
+    file, writer = core.open_output(TWEETS_FILE)
+    with file:
+        # Every (query, strategy) pair is an independent stream; they search
+        # concurrently (bounded by the semaphore) and feed one writer through the queue
+        stop = asyncio.Event()
+        sem = asyncio.Semaphore(CONCURRENCY)
+        queue = asyncio.Queue(maxsize=CONCURRENCY)
+        out = core.QueuedWriter(file, writer)
+        consumer = asyncio.create_task(write_batches(queue, out, existing_ids, state, stop))
         
-        # Write header if file is new
-        if collected_count == 0:
-            writer.writerow(['ID', 'Username', 'Text', 'Created At', 'Retweets', 'Likes', 'Replies'])
+        try:
+            streams = [
+                search_stream(client, sem, queue, stop, state, query, strategy)
+                for query, strategy in pairs
+            ]
+            for outcome in await asyncio.gather(*streams, return_exceptions=True):
+                if isinstance(outcome, Exception):
+                    print(f"Search stream failed: {outcome}")
         
-        # Main collection loop
-        while collected_count < MAX_TWEETS and consecutive_failures < 20:
-            # Generate a query variation
-            current_query = generate_query_variations(QUERY, query_variations)
-            
-            print(f"Collected {collected_count}/{MAX_TWEETS} tweets. Strategy: {SEARCH_STRATEGIES[strategy_index]['product']}, Query: {current_query[:50]}...")
-            
-            # Get current strategy
-            strategy = SEARCH_STRATEGIES[strategy_index]
-            
-            # Get tweets with error handling
-            try:
-                result = await safe_search(
-                    client, 
-                    current_query, 
-                    strategy['product'], 
-                    strategy['count'], 
-                    cursor
-                )
-                
-                if not result:
-                    raise Exception("No result returned")
-                
-                # Convert result to list of tweets
-                tweets = list(result)
-                
-                if not tweets:
-                    raise Exception("No tweets in result")
-                
-                # Save tweets and update count
-                new_count = save_tweets_batch(tweets, writer, existing_ids)
-                
-                if new_count > 0:
-                    collected_count += new_count
-                    consecutive_failures = 0
-                    last_successful_strategy = strategy_index
-                    last_success_time = datetime.now().isoformat()
-                    query_variations = 0  # Reset query variations on success
-                    
-                    # Update cursor for pagination
-                    if hasattr(result, 'next_cursor') and result.next_cursor:
-                        cursor = result.next_cursor
-                    else:
-                        # Try to get next page
-                        try:
-                            next_result = await result.next()
-                            if hasattr(next_result, 'next_cursor') and next_result.next_cursor:
-                                cursor = next_result.next_cursor
-                            else:
-                                cursor = None
-                                strategy_index = (strategy_index + 1) % len(SEARCH_STRATEGIES)
-                        except Exception as e:
-                            print(f"Error getting next page: {e}")
-                            cursor = None
-                            strategy_index = (strategy_index + 1) % len(SEARCH_STRATEGIES)
-                    
-                    print(f"Added {new_count} new tweets. Total: {collected_count}")
-                else:
-                    consecutive_failures += 1
-                    print(f"No new tweets found. Consecutive failures: {consecutive_failures}")
-                    
-                    # Try a different strategy and query variation
-                    strategy_index = (strategy_index + 1) % len(SEARCH_STRATEGIES)
-                    query_variations = (query_variations + 1) % 8  # Cycle through 8 variations
-                    cursor = None
-                
-            except Exception as e:
-                print(f"Error with strategy {strategy['product']}: {e}")
-                consecutive_failures += 1
-                
-                # Try a different strategy and query variation
-                strategy_index = (strategy_index + 1) % len(SEARCH_STRATEGIES)
-                query_variations = (query_variations + 1) % 8  # Cycle through 8 variations
-                cursor = None
-            
-            # Update checkpoint
-            save_checkpoint({
-                'count': collected_count,
-                'cursor': cursor,
-                'strategy_index': strategy_index,
-                'last_successful_strategy': last_successful_strategy,
-                'consecutive_failures': consecutive_failures,
-                'last_success_time': last_success_time,
-                'query_variations': query_variations
-            })
-            
-            # Avoid rate limiting - variable delay based on success
-            if consecutive_failures > 0:
-                delay = random.randint(120, 300)  # Longer delay on failures (2-5 minutes)
-            else:
-                delay = random.randint(30, 90)  # Shorter delay on success (30-90 seconds)
-            
-            print(f"Waiting {delay} seconds before next request...")
-            await asyncio.sleep(delay)
+            await queue.join()
+        finally:
+            # also reached on Ctrl-C: the final flush and saves go through out, behind the
+            # work still queued, and close() waits for all of it before the file closes
+            consumer.cancel()
+            save_state(out, state)
+            out.call(core.save_ids_cache, existing_ids, TWEETS_FILE)
+            await out.close()
         
-        if consecutive_failures >= 20:
-            print("Too many consecutive failures (20). Stopping.")
+        if state['consecutive_failures'] >= MAX_CONSECUTIVE_FAILURES:
+            print(f"Too many consecutive failures ({MAX_CONSECUTIVE_FAILURES}). Stopping.")
         
-        print(f"Completed! Collected {collected_count} tweets")
+        print(f"Completed! Collected {state['count']} tweets")
 
 if __name__ == "__main__":
-    asyncio.run(run_all_operations())
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+    core.run_main(run_all_operations())
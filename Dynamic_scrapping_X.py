@@ -1,251 +1,390 @@
 import asyncio
 import os
-import time
-import csv
 import json
 import random
 import logging
 import argparse
-from datetime import datetime
-from configparser import ConfigParser
-from twikit import Client, TooManyRequests
+import functools
+import re
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import httpx
+
+from scraper import core
 
 # =====================
 # Configuration
 # =====================
-parser = argparse.ArgumentParser(description='Twitter Scraper with Multiple Accounts and Proxy Support')
-parser.add_argument('--account', type=str, required=True, help='Account name from config.ini')
-parser.add_argument('--query', type=str, default='(@HungerStation OR هنقرستيشن OR هانقرستيشن) -كوبون -كود until:2023-12-15 since:2023-12-08', help='Search query')
-parser.add_argument('--max-tweets', type=int, default=5000, help='Maximum tweets to collect')
-parser.add_argument('--product', type=str, default='Latest', choices=['Top', 'Latest', 'Media'], help='Search product type')
-args = parser.parse_args()
-
-# Dynamic configuration based on account
-ACCOUNT_NAME = args.account
-COOKIES_FILE = f'cookies_{ACCOUNT_NAME}.json'
-CHECKPOINT_FILE = f'checkpoint_{ACCOUNT_NAME}.json'
-TWEETS_FILE = f'tweets_{ACCOUNT_NAME}.csv'
-QUERY = args.query
-PRODUCT = args.product
-MAX_TWEETS = args.max_tweets
+DEFAULT_QUERY = '(@HungerStation OR هنقرستيشن OR هانقرستيشن) -كوبون -كود until:2023-12-15 since:2023-12-08'
 BATCH_SIZE = 20  # Reduced to Twitter's default to avoid issues
 MAX_FAILURES = 10  # Increased to allow for more rate limit handling
-MAX_RETRIES = 3
-RETRY_DELAYS = [5, 15, 30]
+MAX_RETRIES = 3  # per search and per login
+CSV_BUFFER_SIZE = 1 << 20  # FastCsvSink hands the rows to os.write() in chunks of about this size
+DURABILITY_EVERY_PAGES = 10  # pages between fsync'd checkpoints (always taken on exit)
+MAX_INFLIGHT = 4  # searches in flight at once across all accounts
+SEARCH_RATE = 1 / 3.0  # searches per second, per account (Twitter's search quota is per account)
+SEARCH_BURST = 15  # searches that may go out back to back after an idle stretch
+# At most the current and the prefetched search per account, so a tiny keepalive pool is enough;
+# what matters is that the idle connection outlives the waits between searches
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=2, keepalive_expiry=300)
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+logger = logging.getLogger('TwitterScraper')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Twitter Scraper with Multiple Accounts and Proxy Support')
+    accounts_arg = parser.add_mutually_exclusive_group(required=True)
+    accounts_arg.add_argument('--accounts', type=str, help='Comma-separated account names from config.ini, scraped concurrently; '
+                              "the query's since:/until: window is split into one day slice per account")
+    accounts_arg.add_argument('--account', type=str, help='A single account name from config.ini')
+    parser.add_argument('--query', type=str, default=DEFAULT_QUERY, help='Search query')
+    parser.add_argument('--max-tweets', type=int, default=5000, help='Maximum tweets to collect')
+    parser.add_argument('--product', type=str, default='Latest', choices=['Top', 'Latest', 'Media'], help='Search product type')
+    parser.add_argument('--max-inflight', type=int, default=MAX_INFLIGHT, help='Searches in flight at once across all accounts (proxies may be shared)')
+    return parser.parse_args(argv)
+
+
+@dataclass
+class ScraperConfig:
+    # Everything one account's run needs; built at startup instead of at import, so importing
+    # this module has no side effects. search_sem is shared by all accounts, bucket is the
+    # account's own.
+    account: str
+    query: str
+    product: str
+    max_tweets: int
+    search_sem: asyncio.Semaphore
+    bucket: core.TokenBucket
+    log: logging.Logger
+    batch_size: int = BATCH_SIZE
+    max_failures: int = MAX_FAILURES
+
+    # Files are per account, so every account resumes on its own
+    @property
+    def cookies_file(self) -> str:
+        return f'cookies_{self.account}.json'
+
+    @property
+    def checkpoint_file(self) -> str:
+        return f'checkpoint_{self.account}.json'
+
+    @property
+    def tweets_file(self) -> str:
+        return f'tweets_{self.account}.csv'
+
+    @property
+    def ids_file(self) -> str:
+        return f'ids_{self.account}.bin'  # int64 ids of the CSV rows, in write order
+
+
+def build_config(account_name: str, query: str = DEFAULT_QUERY, product: str = 'Latest', max_tweets: int = 5000,
+                 search_sem: asyncio.Semaphore | None = None) -> ScraperConfig:
+    return ScraperConfig(
+        account=account_name, query=query, product=product, max_tweets=max_tweets,
+        search_sem=search_sem or asyncio.Semaphore(MAX_INFLIGHT),
+        # one bucket per account: each has its own quota, and its 429s stall only itself
+        bucket=core.TokenBucket(SEARCH_RATE, SEARCH_BURST),
+        log=account_logger(account_name),
+    )
+
+
+_window_re = re.compile(r"\s*(since|until)\s*:\s*(\d{4}-\d{2}-\d{2})", re.IGNORECASE)
+
+
+def split_window(query: str, parts: int) -> list[str]:
+    # The query's since:/until: window cut into `parts` contiguous day slices (until: is
+    # exclusive, so each slice's until is the next one's since), one query per slice
+    bounds = {key.lower(): datetime.strptime(day, '%Y-%m-%d') for key, day in _window_re.findall(query)}
+    if 'since' not in bounds or 'until' not in bounds:
+        raise SystemExit('--accounts needs a since:YYYY-MM-DD until:YYYY-MM-DD window in --query to split between the accounts')
+    days = (bounds['until'] - bounds['since']).days
+    if days < parts:
+        raise SystemExit(f'--accounts: the query window has {days} day(s), fewer than the {parts} accounts')
+    base = _window_re.sub('', query).strip()
+    edges = [bounds['since'] + timedelta(days=days * i // parts) for i in range(parts + 1)]
+    return [f"{base} since:{lo:%Y-%m-%d} until:{hi:%Y-%m-%d}" for lo, hi in zip(edges, edges[1:])]
+
+
+def build_config_from_argv(argv=None) -> list[ScraperConfig]:
+    # one config per account; they share only the in-flight semaphore. Several accounts each
+    # take a slice of the query's window, so they add coverage instead of refetching the
+    # same results into files that duplicate each other.
+    args = parse_args(argv)
+    accounts = list(dict.fromkeys(a.strip() for a in (args.accounts or args.account).split(',') if a.strip()))
+    queries = split_window(args.query, len(accounts)) if len(accounts) > 1 else [args.query]
+    search_sem = asyncio.Semaphore(args.max_inflight)
+    return [build_config(account, query, args.product, args.max_tweets, search_sem)
+            for account, query in zip(accounts, queries)]
 
 # =====================
 # Logging Configuration
 # =====================
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f'scraper_{ACCOUNT_NAME}.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(f'TwitterScraper_{ACCOUNT_NAME}')
+def account_logger(account: str) -> logging.Logger:
+    # each account keeps its own log file; records also propagate to the console
+    log = logging.getLogger(f'TwitterScraper_{account}')
+    if not log.handlers:
+        handler = logging.FileHandler(f'scraper_{account}.log')
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        log.addHandler(handler)
+    return log
 
 # =====================
 # Enhanced Helpers
 # =====================
-async def check_cookies_valid(client: Client) -> bool:
+# Login, search, checkpoint I/O and the CSV id scan are scraper.core's; what stays here is
+# this script's own output path (id sidecar, id range, FastCsvSink).
+CHECKPOINT_DEFAULT = {
+    # id_range: [min_id, max_id] of a Latest walk that covers every row of the CSV (see run())
+    'count': 0, 'cursor': None, 'last_success': None, 'query': None, 'id_range': None,
+}
+
+# run() always saves the same keys, so without orjson the checkpoint is filled into a fixed
+# template (~4x faster than json.dumps); any other shape goes through core.dump_json
+CHECKPOINT_KEYS = frozenset(('count', 'cursor', 'last_success', 'query', 'id_range', 'csv_bytes', 'ids_bytes'))
+CHECKPOINT_TEMPLATE = (b'{"count":%d,"cursor":%b,"last_success":%b,"query":%b,'
+                       b'"id_range":%b,"csv_bytes":%d,"ids_bytes":%d}')
+
+def _json_str(value) -> bytes:
+    return b'null' if value is None else json.encoder.encode_basestring(value).encode('utf-8')
+
+@functools.lru_cache(maxsize=16)
+def _json_query(query: str) -> bytes:
+    return _json_str(query)  # the same few queries on every save
+
+def dump_checkpoint(data: dict) -> bytes:
+    if core.orjson or data.keys() != CHECKPOINT_KEYS:
+        return core.dump_json(data)
+    id_range = data['id_range']
+    return CHECKPOINT_TEMPLATE % (
+        data['count'], _json_str(data['cursor']), _json_str(data['last_success']), _json_query(data['query']),
+        b'null' if id_range is None else b'[%d,%d]' % tuple(id_range), data['csv_bytes'], data['ids_bytes'],
+    )
+
+def read_ids_set(csv_path: str, offset: int = 0, log: logging.Logger = logger) -> set:
+    # ids of the rows from byte offset on (0: the whole file)
+    if not os.path.exists(csv_path):
+        return set()
     try:
-        await client.get_trends('trending')
-        return True
+        return set(core.read_csv_ids(csv_path, offset))
     except Exception as e:
-        logger.error(f"Cookie validation failed: {e}")
+        log.error("Error reading existing tweets: %s", e)
+        return set()
+
+def sync_ids_file(ids_path: str, ckpt: dict, csv_bytes: int) -> bool:
+    # The sidecar is trusted up to the ids_bytes of the last checkpoint, so trim anything a kill
+    # left past it. False when it doesn't line up with the CSV at all (missing, older than it).
+    ids_bytes = ckpt.get('ids_bytes')
+    if ids_bytes is None or ckpt.get('csv_bytes') is None or csv_bytes < ckpt['csv_bytes']:
         return False
+    if not os.path.exists(ids_path) or os.path.getsize(ids_path) < ids_bytes:
+        return False
+    if os.path.getsize(ids_path) > ids_bytes:
+        os.truncate(ids_path, ids_bytes)
+    return True
 
-async def safe_search_with_retry(client: Client, query: str, count: int = BATCH_SIZE, cursor=None):
-    """Perform a search with enhanced rate limit handling"""
-    for attempt in range(MAX_RETRIES):
-        try:
-            result = await client.search_tweet(query, PRODUCT, count=count, cursor=cursor)
-            return result
-        except TooManyRequests as e:
-            # Get the rate limit reset time from the exception
-            reset_time = getattr(e, 'rate_limit_reset', None)
-            
-            if reset_time:
-                # Calculate wait time based on Twitter's reset time
-                wait_time = max(reset_time - time.time(), 0) + 5  # Add 5 seconds buffer
-                logger.warning(f"Rate limited. Waiting {wait_time:.0f}s until {datetime.fromtimestamp(reset_time)}")
-                await asyncio.sleep(wait_time)
-                # Continue to next attempt without counting as a failure
-                continue
-            else:
-                # If no reset time provided, use exponential backoff
-                wait_time = RETRY_DELAYS[attempt]
-                logger.warning(f"Rate limited (no reset time). Waiting {wait_time}s")
-                await asyncio.sleep(wait_time)
-        except Exception as e:
-            logger.error(f"Search error (attempt {attempt+1}/{MAX_RETRIES}): {e}")
-            if attempt < MAX_RETRIES - 1:
-                wait_time = RETRY_DELAYS[attempt]
-                logger.info(f"Retrying in {wait_time} seconds...")
-                await asyncio.sleep(wait_time)
-            else:
-                logger.error(f"All {MAX_RETRIES} search attempts failed")
-    return None
-
-def load_checkpoint():
-    if os.path.exists(CHECKPOINT_FILE):
-        try:
-            with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading checkpoint: {e}")
-    return { 'count': 0, 'cursor': None, 'last_success': None }
+def load_existing_ids(csv_path: str, ids_path: str, ckpt: dict, ids_ok: bool, log: logging.Logger = logger):
+    # 8 bytes per id straight into an array instead of csv-parsing the whole file; only rows
+    # written after the last checkpoint are parsed, then appended so the sidecar catches up
+    if not ids_ok:
+        existing_ids = read_ids_set(csv_path, log=log)
+        with open(ids_path, 'wb') as f:
+            array('q', existing_ids).tofile(f)
+        return existing_ids
+    ids = array('q')
+    with open(ids_path, 'rb') as f:
+        ids.frombytes(f.read())
+    existing_ids = set(ids)
+    tail = read_ids_set(csv_path, ckpt['csv_bytes'], log) - existing_ids
+    if tail:
+        with open(ids_path, 'ab') as f:
+            array('q', tail).tofile(f)
+        existing_ids |= tail
+    return existing_ids
 
-def save_checkpoint(data):
-    try:
-        with open(CHECKPOINT_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f)
-    except Exception as e:
-        logger.error(f"Error saving checkpoint: {e}")
+class FastCsvSink:
+    # Appends rows to the CSV without csv.writer: the schema is fixed and only the tweet text
+    # can hold commas, quotes or newlines, so each row is formatted with one f-string and the
+    # encoded rows pile up in a bytearray that goes to os.write() ~1 MiB at a time.
+    # Output matches csv.writer's dialect closely enough for csv.reader (\r\n, "" escapes).
+
+    def __init__(self, path: str, buffer_size: int = CSV_BUFFER_SIZE):
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.buffer_size = buffer_size
+        self.buf = bytearray()
+
+    def writeheader(self):
+        self.buf += (','.join(core.CSV_HEADER) + '\r\n').encode('utf-8')
 
-def init_existing_ids(csv_path: str):
-    ids = set()
-    if os.path.exists(csv_path):
+    def writerows(self, rows):
+        lines = []
+        append = lines.append
+        for tid, user, text, created_at, retweets, likes, replies in rows:
+            text = text.replace('"', '""')
+            append(f'{tid},{user},"{text}",{created_at},{retweets},{likes},{replies}\r\n')
+        self.buf += ''.join(lines).encode('utf-8')
+        if len(self.buf) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        view = memoryview(self.buf)
+        while view:
+            view = view[os.write(self.fd, view):]  # os.write may take only part of the buffer
+        view.release()
+        self.buf.clear()
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def close(self):
         try:
-            with open(csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                next(reader, None)
-                for row in reader:
-                    if row:
-                        ids.add(row[0])
-        except Exception as e:
-            logger.error(f"Error reading existing tweets: {e}")
-    return ids
+            self.flush()
+        finally:
+            os.close(self.fd)
 
-def save_tweets_batch(tweets, writer, existing_ids) -> int:
-    new_count = 0
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+async def safe_search_with_retry(client, cfg: ScraperConfig, cursor=None):
+    # core.safe_search, paced by the account's bucket and the accounts' shared in-flight cap
+    return await core.safe_search(client, cfg.query, cfg.product, cfg.batch_size, cursor, cfg.log,
+                                  MAX_RETRIES, limiter=cfg.bucket, sem=cfg.search_sem)
+
+def save_tweets_batch(tweets, writer, existing_ids: set, id_range: list[int] | None = None, ids_out=None,
+                      log: logging.Logger = logger) -> tuple[int, list[int] | None]:
+    # One pass over the search result itself (no list() copy): build the page's rows, then
+    # hand them to the FastCsvSink in one writerows() call. Returns (added, [min_id, max_id] of
+    # the page); the span is None when the page was empty. Rows are core.tweet_row's.
+    lo, hi = id_range or (1, 0)  # ids inside the range are already in the CSV
+    page_lo: int | None = None
+    page_hi: int = 0
+    rows: list[tuple] = []
+    fresh = array('q')  # ids of the kept rows, parsed once in the loop
+    # bound once, not looked up per tweet
+    append, keep, tweet_row = rows.append, fresh.append, core.tweet_row
     for tw in tweets:
-        if tw.id in existing_ids:
+        tid = int(tw.id)
+        if page_lo is None:
+            page_lo = page_hi = tid
+        elif tid < page_lo:
+            page_lo = tid
+        elif tid > page_hi:
+            page_hi = tid
+        if lo <= tid <= hi or tid in existing_ids:
             continue
         try:
-            writer.writerow([
-                tw.id,
-                f"@{tw.user.screen_name}",
-                tw.text,
-                tw.created_at,
-                getattr(tw, 'retweet_count', 0),
-                getattr(tw, 'favorite_count', 0),
-                getattr(tw, 'reply_count', 0),
-            ])
-            existing_ids.add(tw.id)
-            new_count += 1
+            append(tweet_row(tw))
         except Exception as e:
-            logger.error(f"Error saving tweet {tw.id}: {e}")
-    return new_count
-
-# =====================
-# Auth / Login with Enhanced Error Handling
-# =====================
-async def init_client() -> Client | None:
-    config = ConfigParser()
-    config.read('config.ini')
-    
-    # Get account-specific configuration
-    if ACCOUNT_NAME not in config:
-        logger.error(f"Account '{ACCOUNT_NAME}' not found in config.ini")
-        return None
-        
+            log.error("Error saving tweet %s: %s", tw.id, e)
+            continue
+        keep(tid)
+    page = None if page_lo is None else [page_lo, page_hi]
     try:
-        username = config[ACCOUNT_NAME]['username']
-        email = config[ACCOUNT_NAME]['email']
-        password = config[ACCOUNT_NAME]['password']
-        proxy_str = config[ACCOUNT_NAME].get('proxy', '').strip()
-        
-        # Handle proxy value conversion
-        if proxy_str.lower() in ['none', 'no-proxy', '']:
-            proxy = None
-        else:
-            proxy = proxy_str
-    except KeyError as e:
-        logger.error(f"Missing config for account {ACCOUNT_NAME}: {e}")
-        return None
-
-    # Initialize client with proxy if provided
-    client = Client(language='ar', proxy=proxy)
-    
-    if os.path.exists(COOKIES_FILE):
-        try:
-            client.load_cookies(COOKIES_FILE)
-            logger.info("Loaded existing cookies")
-            if await check_cookies_valid(client):
-                logger.info("Cookies are valid")
-                return client
-            else:
-                logger.warning("Cookies expired — re-login required")
-        except Exception as e:
-            logger.error(f"Error loading cookies: {e}")
-
-    # Login with retry logic
-    for attempt in range(MAX_RETRIES):
-        try:
-            logger.info(f"Logging in (attempt {attempt+1}/{MAX_RETRIES})...")
-            await client.login(auth_info_1=username, auth_info_2=email, password=password)
-            client.save_cookies(COOKIES_FILE)
-            logger.info("Logged in & saved cookies")
-            return client
-        except Exception as e:
-            logger.error(f"Login failed (attempt {attempt+1}/{MAX_RETRIES}): {e}")
-            if attempt < MAX_RETRIES - 1:
-                wait_time = RETRY_DELAYS[attempt]
-                logger.info(f"Retrying login in {wait_time} seconds...")
-                await asyncio.sleep(wait_time)
-    
-    logger.error(f"All {MAX_RETRIES} login attempts failed")
-    return None
+        writer.writerows(rows)
+    except Exception as e:
+        log.error("Error saving %d tweets: %s", len(rows), e)
+        return 0, page
+    existing_ids.update(fresh)
+    if ids_out is not None:
+        ids_out.write(fresh.tobytes())
+    return len(rows), page
 
 # =====================
 # Enhanced Main Loop with Better Rate Limit Handling
 # =====================
-async def run():
-    logger.info(f"Starting scraper for account '{ACCOUNT_NAME}' with query: {QUERY}")
+async def run(cfg: ScraperConfig) -> int:
+    log = cfg.log
+    log.info("Starting scraper for account '%s' with query: %s", cfg.account, cfg.query)
     
-    client = await init_client()
+    client = await core.init_client(cfg.account, cfg.cookies_file, use_proxy=True,
+                                    login_attempts=MAX_RETRIES, limits=HTTP_LIMITS, log=log)
     if not client:
-        return
+        return 0
 
-    ckpt = load_checkpoint()
+    ckpt_file, csv_path, ids_path = cfg.checkpoint_file, cfg.tweets_file, cfg.ids_file
+    ckpt = core.load_checkpoint(ckpt_file, CHECKPOINT_DEFAULT, log)
+    if ckpt.get('query') not in (None, cfg.query):
+        # e.g. the window was split differently (another number of accounts): that cursor
+        # pages another query, and the count was toward it
+        log.info('Checkpoint belongs to a different query — starting fresh')
+        ckpt = dict(CHECKPOINT_DEFAULT)
     collected = ckpt['count']
     cursor = ckpt['cursor']
     last_success = ckpt.get('last_success')
-    existing_ids = init_existing_ids(TWEETS_FILE)
 
-    new_file = not os.path.exists(TWEETS_FILE) or os.path.getsize(TWEETS_FILE) == 0
-    with open(TWEETS_FILE, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
+    # Latest pages come newest first, and snowflake ids grow with time, so one walk down the
+    # results covers a contiguous id span. While the CSV is exactly that span (started empty,
+    # same query) a [min_id, max_id] range replaces scanning the whole file into a set, and
+    # existing_ids only has to hold this session's ids. Top/Media aren't ordered by id.
+    # A kill between checkpoints can leave rows past csv_bytes that the range doesn't cover.
+    csv_bytes = os.path.getsize(csv_path) if os.path.exists(csv_path) else 0
+    new_file = csv_bytes == 0
+    ids_ok = sync_ids_file(ids_path, ckpt, csv_bytes)
+    trusted = ids_ok and ckpt.get('query') == cfg.query and ckpt['csv_bytes'] == csv_bytes
+    id_range = ckpt.get('id_range') if trusted else None
+    track_range = cfg.product == 'Latest' and (new_file or id_range is not None)
+    if not track_range:
+        id_range = None
+    if track_range and new_file:
+        open(ids_path, 'wb').close()
+    existing_ids = set() if track_range else load_existing_ids(csv_path, ids_path, ckpt, ids_ok, log)
+    walk = None  # span of a walk restarted from the top that hasn't reached id_range yet
+
+    # both outputs are binary appends behind a fat buffer; they reach the disk at checkpoints
+    with FastCsvSink(csv_path) as writer, open(ids_path, 'ab', buffering=CSV_BUFFER_SIZE) as ids_out:
         if new_file:
-            writer.writerow(['ID', 'Username', 'Text', 'Created At', 'Retweets', 'Likes', 'Replies'])
+            writer.writeheader()
+
+        def checkpoint():
+            # One barrier for the whole group: rows and ids reach the disk before the checkpoint
+            # that points past them is renamed in, so after a crash the pair always agrees.
+            # The fsyncs are slow, so the loop runs this in a worker thread: the event loop
+            # drives every account's searches and must not wait on one account's disk.
+            writer.flush()
+            ids_out.flush()
+            os.fsync(writer.fileno())
+            os.fsync(ids_out.fileno())
+            ckpt.update({'query': cfg.query, 'csv_bytes': os.fstat(writer.fileno()).st_size,
+                         'ids_bytes': os.fstat(ids_out.fileno()).st_size,
+                         'id_range': id_range if track_range and walk is None else None})
+            core.save_checkpoint(ckpt_file, ckpt, log, durable=True, dumps=dump_checkpoint)
 
         failures = 0
-        while collected < MAX_TWEETS and failures < MAX_FAILURES:
-            logger.info(f"Collected {collected}/{MAX_TWEETS} — cursor={cursor}")
+        pages_since_ckpt = 0
+        pending = None  # the next page's search, started before the current page is written
+        io = None  # the worker-thread job on writer/ids_out (page write or barrier) last started
+
+        async def off_loop(fn, *args):
+            # Shielded: cancelling run() stops the await, not the thread, so `io` is kept for
+            # the finally block to wait on before it flushes and closes the same outputs
+            nonlocal io
+            io = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+            return await asyncio.shield(io)
+
+        try:
+            while collected < cfg.max_tweets and failures < cfg.max_failures:
+                log.info("Collected %d/%d — cursor=%s", collected, cfg.max_tweets, cursor)
             
-            result = await safe_search_with_retry(client, QUERY, BATCH_SIZE, cursor)
-            if not result:
-                failures += 1
-                logger.warning(f"Search failed ({failures}/{MAX_FAILURES})")
-                cursor = None
-            else:
-                tweets = list(result)
-                if not tweets:
+                if pending is None:
+                    from_top = cursor is None
+                    result = await safe_search_with_retry(client, cfg, cursor)
+                else:
+                    from_top = False
+                    result, pending = await pending, None
+                if result is None:
+                    failures += 1
+                    log.warning("Search failed (%d/%d)", failures, cfg.max_failures)
+                    cursor = None
+                elif not len(result):
                     failures += 1
-                    logger.warning(f"No tweets found ({failures}/{MAX_FAILURES})")
+                    log.warning("No tweets found (%d/%d)", failures, cfg.max_failures)
                     cursor = None
                 else:
-                    added = save_tweets_batch(tweets, writer, existing_ids)
-                    collected += added
-                    failures = 0
-                    last_success = datetime.now().isoformat()
-                    
-                    # Flush to ensure data is written to disk
-                    f.flush()
-                    
                     try:
                         # Try to get next cursor for pagination
                         if hasattr(result, 'next_cursor') and result.next_cursor:
@@ -258,27 +397,78 @@ async def run():
                             else:
                                 cursor = None
                     except Exception as e:
-                        logger.error(f"Error getting next cursor: {e}")
+                        log.error("Error getting next cursor: %s", e)
                         cursor = None
-                    
-                    logger.info(f"Added {added} tweets. Total={collected}")
-
-            ckpt.update({'count': collected, 'cursor': cursor, 'last_success': last_success})
-            save_checkpoint(ckpt)
-
-            # Adaptive delay based on success/failure and time since last success
-            if failures == 0:
-                delay = random.randint(5, 15)  # Shorter delay on success
-            else:
-                # Longer delay on failure, increasing with consecutive failures
-                delay = random.randint(30, 60) * failures
-                
-            logger.info(f"Waiting {delay} seconds before next request...")
-            await asyncio.sleep(delay)
-
-        if failures >= MAX_FAILURES:
-            logger.warning(f"Stopping due to {failures} consecutive failures")
-        logger.info(f"Completed. Collected {collected} tweets.")
+
+                    # Double-buffer: the next search (paced by the bucket as usual) is in flight
+                    # while this page is written off the event loop, so a page costs
+                    # max(fetch, write) rather than their sum. Skipped when this page may be the last.
+                    if cursor and collected + len(result) < cfg.max_tweets:
+                        pending = asyncio.create_task(safe_search_with_retry(client, cfg, cursor))
+                    added, page = await off_loop(
+                        save_tweets_batch, result, writer, existing_ids, id_range, ids_out, log)
+                    collected += added
+                    if track_range:
+                        if id_range is None:
+                            id_range = page
+                        elif from_top or walk is not None:
+                            if from_top and walk is not None:
+                                # a second restart before the first one joined up: two gaps to
+                                # keep track of, so fall back to the exact set for this file
+                                track_range = False
+                            else:
+                                walk = page if walk is None else [min(walk[0], page[0]), max(walk[1], page[1])]
+                                if walk[0] <= id_range[1]:  # reached the known span: contiguous again
+                                    id_range = [min(id_range[0], walk[0]), max(id_range[1], walk[1])]
+                                    walk = None
+                        else:
+                            id_range[0] = min(id_range[0], page[0])
+                    failures = 0
+                    last_success = datetime.now().isoformat()
+                    log.info("Added %d tweets. Total=%d", added, collected)
+
+                ckpt.update({'count': collected, 'cursor': cursor, 'last_success': last_success})
+                pages_since_ckpt += 1
+                if pages_since_ckpt >= DURABILITY_EVERY_PAGES:
+                    await off_loop(checkpoint)
+                    pages_since_ckpt = 0
+
+                # After a success the bucket paces the next search; failures still back off,
+                # increasingly with consecutive failures
+                if failures:
+                    delay = random.randint(30, 60) * failures
+                    log.info("Waiting %d seconds before next request...", delay)
+                    await asyncio.sleep(delay)
+        finally:
+            # also reached on Ctrl-C: asyncio.run() cancels run() and unwinds through here
+            if pending is not None:
+                pending.cancel()  # its page was never written; the checkpoint cursor points at it
+            if io is not None and not io.done():
+                # Cancelled mid-write: the thread is still appending to the buffers. Its page
+                # reaches the CSV and the sidecar but not id_range or the cursor, so the
+                # checkpoint drops the range and the next run refetches that page against
+                # the exact id set instead.
+                track_range = False
+                try:
+                    await asyncio.shield(io)
+                except Exception as e:
+                    log.error("Error writing the last page: %s", e)
+            checkpoint()
+
+        if failures >= cfg.max_failures:
+            log.warning("Stopping due to %d consecutive failures", failures)
+        log.info("Completed. Collected %d tweets.", collected)
+    return collected
+
+
+async def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, handlers=[logging.StreamHandler()])
+    cfgs = build_config_from_argv(argv)
+    # accounts are independent: one process overlaps their rate-limit waits
+    results = await asyncio.gather(*(run(cfg) for cfg in cfgs), return_exceptions=True)
+    for cfg, outcome in zip(cfgs, results):
+        if isinstance(outcome, Exception):
+            logger.error("Account %s failed: %s", cfg.account, outcome)
 
 if __name__ == "__main__":
-    asyncio.run(run())
\ No newline at end of file
+    core.run_main(main())
\ No newline at end of file
@@ -0,0 +1,5 @@
+"""Shared twikit scraping core: see scraper.core, and scraper.cli for running several queries at once."""
+
+from .core import init_client, query_hash, run, safe_search
+
+__all__ = ['init_client', 'query_hash', 'run', 'safe_search']
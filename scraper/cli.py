@@ -0,0 +1,72 @@
+"""
+Scrape several queries from one process: twikit is imported and the account logged in
+once, and the queries share the client, its connection pool and the rate limiter while
+their collection loops overlap their waits.
+
+Run:
+  python -m scraper.cli --query "(@HungerStation OR هنقرستيشن)" --query "(ثمانية OR ثمانيه)"
+
+Each query gets its own tweets_<query hash>.csv and checkpoint_<query hash>.json, so
+reruns resume every query where it stopped.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import logging
+
+from . import core
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Resumable X (Twitter) search scraper for one or more queries')
+    parser.add_argument('--query', required=True, action='append', help='Search query; repeat to scrape several')
+    parser.add_argument('--product', default='Latest', choices=core.PRODUCTS)
+    parser.add_argument('--rotate', action='store_true', help='Move on to the next product when one runs out of pages')
+    parser.add_argument('--max-tweets', type=int, default=1000, help='Cap per query')
+    parser.add_argument('--max-failures', type=int, default=20, help='Consecutive failure cap before giving up a query')
+    parser.add_argument('--concurrency', type=int, default=2, help='How many of the queries are scraped at the same time')
+    parser.add_argument('--format', default='csv', choices=['csv', 'parquet'], help='Output format; parquet needs pyarrow')
+    parser.add_argument('--account', default='X', help='Section of config.ini with the login')
+    parser.add_argument('--cookies', default=core.COOKIES_FILE, help='Cookie file, reused across runs')
+    parser.add_argument('--prefix', default='tweets', help='Output files are <prefix>_<query hash>.<format>')
+    return parser.parse_args(argv)
+
+
+async def run_query(client, query: str, args, sem: asyncio.Semaphore) -> int:
+    qhash = core.query_hash(query)
+    out_path = f'{args.prefix}_{qhash}.{args.format}'
+    log = logging.getLogger(f'scraper.{qhash}')
+    async with sem:
+        log.info("Query: %s | output: %s", query, out_path)
+        return await core.run(client, query, out_path, f'checkpoint_{qhash}.json', args.product, args.max_tweets,
+                              fmt=args.format, rotate=args.rotate, max_failures=args.max_failures, log=log)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    if args.format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        raise SystemExit('--format parquet needs pyarrow (pip install pyarrow)')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # queries that only differ in case/whitespace would share files, so keep one of each
+    by_hash = {}
+    for q in args.query:
+        by_hash.setdefault(core.query_hash(q), q)
+    queries = list(by_hash.values())
+    client = await core.init_client(args.account, args.cookies)
+    if not client:
+        core.logger.error('Failed to initialize client')
+        return
+
+    sem = asyncio.Semaphore(args.concurrency)
+    results = await asyncio.gather(*(run_query(client, q, args, sem) for q in queries), return_exceptions=True)
+    for query, outcome in zip(queries, results):
+        if isinstance(outcome, Exception):
+            core.logger.error("Query %s failed: %s", query, outcome)
+        else:
+            core.logger.info("Query %s: %s tweets", query, outcome)
+
+
+if __name__ == '__main__':
+    core.run_main(main())
@@ -0,0 +1,828 @@
+"""
+Shared core of the twikit search scrapers.
+
+The 1k.tweet*.py scripts and Dynamic_scrapping/init.py used to carry their own copies of
+the login, search, checkpoint and CSV helpers; they now only hold their configuration and
+call into this module (Dynamic_scrapping_X.py keeps its own output path and collection
+loop but uses the helpers below):
+  - init_client(): one pooled, rate-limit-aware client per process (cookies, then login)
+  - safe_search(): header-paced search with retries
+  - run(): the resumable collection loop for one query (atomic checkpoint, dedup set,
+    CSV or Parquet output)
+
+scraper.cli runs several queries through run() in one process, so twikit is imported and
+the account logged in once for all of them.
+"""
+
+import asyncio
+import bisect
+import csv
+import functools
+import hashlib
+import heapq
+import importlib.util
+import io
+import itertools
+import json
+import logging
+import os
+import pickle
+import random
+import re
+import time
+from array import array
+from collections import deque
+from datetime import datetime
+
+import httpx
+from twikit import Client, TooManyRequests
+
+try:
+    import orjson  # 2-5x faster checkpoint (de)serialization
+except ImportError:
+    orjson = None  # fall back to the stdlib json module
+
+try:
+    from xxhash import xxh64_intdigest  # fast 64-bit fingerprints of the long cursor strings
+except ImportError:
+    # the fingerprints never leave the process, so str's own 64-bit hash will do: no
+    # encoding, no extra hashing pass
+    xxh64_intdigest = hash
+
+# =====================
+# Defaults
+# =====================
+COOKIES_FILE = 'cookies.json'
+CONFIG_FILE = 'config.ini'
+BATCH_SIZE = 20  # Twitter's maximum per request
+CHECKPOINT_EVERY = 10  # loop iterations between checkpoint writes (always saved on exit)
+CSV_BUFFER_SIZE = 1 << 16  # rows are written by the page; let them coalesce before hitting disk
+FLUSH_EVERY = 5  # pages between explicit CSV flushes
+WRITE_BACKLOG = 8  # queued output calls (rows, flushes, snapshots) collection may run ahead of the disk by
+IDS_CACHE_SUFFIX = '.ids'  # pickled dedup set, saved on exit, reused if the CSV is unchanged
+IDS_CACHE_MAX_AGE = 24 * 3600
+SEEN_CURSORS_MAX = 1024  # cursors remembered for loop detection
+MAX_RETRIES = 5
+RETRY_DELAYS = [5, 15, 30, 60, 120]  # backoff between search retries
+CSV_HEADER = ['ID', 'Username', 'Text', 'Created At', 'Retweets', 'Likes', 'Replies']
+PRODUCTS = ('Top', 'Latest', 'Media')
+
+# One pooled HTTP session per run: keepalive outlives the sleeps between requests so
+# the TCP/TLS connection is reused instead of re-handshaking on every search.
+# Every request goes to the same host, so max_connections is effectively the per-host cap;
+# reused connections also skip the DNS lookup, which httpx/anyio run off the event loop.
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=64, keepalive_expiry=300)
+HTTP2 = importlib.util.find_spec('h2') is not None  # httpx needs the h2 extra for HTTP/2
+
+logger = logging.getLogger('scraper')
+
+# =====================
+# Query helpers
+# =====================
+
+def normalize_query(q: str) -> str:
+    return re.sub(r"\s+", " ", q.strip().lower())
+
+
+def query_hash(q: str) -> str:
+    # stable short id of a query, used to name per-query files and to tag checkpoints
+    return hashlib.md5(normalize_query(q).encode('utf-8')).hexdigest()[:10]
+
+# =====================
+# Checkpoint
+# =====================
+
+def load_checkpoint(path: str, default: dict, log: logging.Logger = logger) -> dict:
+    # a copy of default when the file is missing or unreadable
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                return orjson.loads(f.read()) if orjson else json.load(f)
+        except Exception as e:
+            log.error("Error loading checkpoint: %s", e)
+    return dict(default)
+
+
+def dump_json(data) -> bytes:
+    return orjson.dumps(data) if orjson else json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def save_checkpoint(path: str, data: dict, log: logging.Logger = logger, durable: bool = False, dumps=dump_json):
+    # durable: fsync before the rename, for callers that fsync their output at the same barrier
+    try:
+        # write-then-rename so a crash mid-write never leaves a truncated checkpoint
+        with open(path + '.tmp', 'wb') as f:
+            f.write(dumps(data))
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+    except Exception as e:
+        log.error("Error saving checkpoint: %s", e)
+
+# =====================
+# Output + dedup
+# =====================
+
+class IdIndex:
+    # Dedup set of tweet ids, packed for big resumes: the bulk lives in a sorted
+    # array('q') (8 bytes an id, against ~60-100 for an int in a set) searched with
+    # bisect; ids added since the last merge sit in a small set, merged in once it
+    # outgrows a fraction of the array so merges stay amortized O(1) per id.
+    # Loads and merges stream through heapq.merge into the new array, so the ids are never
+    # all Python ints in a list at once.
+    MERGE_MIN = 4096
+    LOAD_CHUNK = 1 << 16  # ids sorted as a list at a time while loading
+
+    def __init__(self, ids=()):
+        self._sorted = self._sorted_array(ids)
+        self._recent = set()
+
+    @classmethod
+    def _sorted_array(cls, ids) -> array:
+        # sort the ids in packed runs of LOAD_CHUNK, then merge the runs
+        it = iter(ids)
+        runs = []
+        while True:
+            chunk = sorted(itertools.islice(it, cls.LOAD_CHUNK))
+            if not chunk:
+                break
+            runs.append(array('q', chunk))
+        if len(runs) <= 1:
+            return runs[0] if runs else array('q')
+        return array('q', heapq.merge(*runs))
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    def _in_sorted(self, tid) -> bool:
+        i = bisect.bisect_left(self._sorted, tid)
+        return i < len(self._sorted) and self._sorted[i] == tid
+
+    def __contains__(self, tid):
+        return tid in self._recent or self._in_sorted(tid)
+
+    def unseen(self, ids) -> set:
+        # one set difference against the recent ids, then a bisect per survivor
+        fresh = set(ids) - self._recent
+        if self._sorted:
+            fresh = {tid for tid in fresh if not self._in_sorted(tid)}
+        return fresh
+
+    def update(self, ids):
+        self._recent.update(ids)
+        if len(self._recent) > max(self.MERGE_MIN, len(self._sorted) >> 3):
+            self._merge()
+
+    def __ior__(self, ids):
+        self.update(ids)
+        return self
+
+    def _merge(self):
+        if self._recent:
+            self._sorted = array('q', heapq.merge(self._sorted, sorted(self._recent)))
+            self._recent = set()
+
+    def __getstate__(self):
+        # pickles as the raw packed array
+        self._merge()
+        return self._sorted
+
+    def __setstate__(self, state):
+        self._sorted = state
+        self._recent = set()
+
+
+def save_ids_cache(existing_ids, csv_path: str):
+    # snapshot the dedup set next to the CSV, tagged with the CSV state it matches
+    meta = {'csv_mtime': os.path.getmtime(csv_path), 'csv_size': os.path.getsize(csv_path), 'saved_at': time.time()}
+    tmp_file = csv_path + IDS_CACHE_SUFFIX + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        pickle.dump((meta, existing_ids), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, csv_path + IDS_CACHE_SUFFIX)
+
+
+def load_ids_cache(csv_path: str):
+    # None unless the cache is < IDS_CACHE_MAX_AGE old and the CSV is untouched since
+    try:
+        with open(csv_path + IDS_CACHE_SUFFIX, 'rb') as f:
+            meta, ids = pickle.load(f)
+        if time.time() - meta['saved_at'] > IDS_CACHE_MAX_AGE:
+            return None
+        if meta['csv_mtime'] != os.path.getmtime(csv_path) or meta['csv_size'] != os.path.getsize(csv_path):
+            return None
+        return ids if isinstance(ids, IdIndex) else IdIndex(ids)  # caches from before IdIndex hold a set
+    except Exception:
+        return None
+
+
+def read_csv_ids(path: str, offset: int = 0):
+    # ids (as ints) of the CSV rows from byte offset on; 0 reads the whole file past the
+    # header. One streaming pass: quoted multi-line tweet text rules out slicing raw bytes.
+    with open(path, 'rb') as raw:
+        raw.seek(offset)
+        reader = csv.reader(io.TextIOWrapper(raw, encoding='utf-8', newline=''))
+        if offset == 0:
+            next(reader, None)
+        yield from (int(row[0]) for row in reader if row and row[0].isdigit())
+
+
+def init_existing_ids(path: str, log: logging.Logger = logger) -> IdIndex:
+    # ids (as ints) already in the output, so resumed runs skip them
+    if not os.path.exists(path):
+        return IdIndex()
+    if os.path.isdir(path):
+        return parquet_existing_ids(path, log)
+    cached = load_ids_cache(path)
+    if cached is not None:
+        return cached
+    try:
+        return IdIndex(read_csv_ids(path))
+    except Exception as e:
+        log.error("Error reading existing tweets: %s", e)
+        return IdIndex()
+
+
+def open_output(path: str, fmt: str = 'csv'):
+    # (file, writer) pair; for parquet both are the same ParquetTweetWriter
+    if fmt == 'parquet':
+        f = writer = ParquetTweetWriter(path)
+        return f, writer
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    f = open(path, 'a', newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE)
+    writer = csv.writer(f)
+    if new_file:
+        writer.writerow(CSV_HEADER)
+    return f, writer
+
+
+def tweet_row(tw) -> tuple:
+    # one tweet as a CSV_HEADER row; twikit's Tweet always has the counts (properties
+    # over its legacy dict)
+    return (tw.id, '@' + tw.user.screen_name, tw.text, tw.created_at,
+            tw.retweet_count, tw.favorite_count, tw.reply_count)
+
+
+def save_tweets_batch(tweets, writer, existing_ids, log: logging.Logger = logger) -> int:
+    # key the page by numeric id (drops in-page repeats too) and find the unseen ids in
+    # one call; they join existing_ids only once their rows are written
+    page = {int(tw.id): tw for tw in tweets}
+    fresh = existing_ids.unseen(page)
+    rows = []
+    for tid, tw in page.items():
+        if tid not in fresh:
+            continue
+        try:
+            rows.append(tweet_row(tw))
+        except Exception as e:
+            log.error("Error saving tweet %s: %s", tid, e)
+            fresh.discard(tid)
+    try:
+        writer.writerows(rows)
+    except Exception as e:
+        log.error("Error saving %d tweets: %s", len(rows), e)
+        return 0
+    existing_ids |= fresh
+    return len(rows)
+
+class QueuedWriter:
+    # Owns the output while run() collects: rows, flushes and checkpoint/cache snapshots
+    # are queued from the loop and applied in order by one background task, each in a
+    # worker thread, so a slow (e.g. network) disk never stalls the event loop and the
+    # searches in flight on it. Stands in for the csv writer in save_tweets_batch().
+    # writerows() can't fail from the caller's side: by the time a queued write raises, its
+    # page is already counted and its ids marked seen. So the first error sets `failed`,
+    # run() stops, and nothing queued after it is applied: the last checkpoint (and ids
+    # cache) on disk then predates the lost rows, and the next run fetches them again.
+    # Calls are never refused (a checkpoint must always queue behind its rows); instead
+    # collectors await wait_for_room() before fetching, so a stalled disk holds them at
+    # max_backlog queued calls rather than letting them count pages that aren't written.
+    def __init__(self, f, writer, log: logging.Logger = logger, max_backlog: int = WRITE_BACKLOG):
+        self._f = f
+        self._writer = writer
+        self.log = log
+        self.failed = False
+        self.max_backlog = max_backlog
+        self._queue = asyncio.Queue()
+        self._room = asyncio.Event()
+        self._room.set()
+        self._task = asyncio.create_task(self._drain())
+
+    def call(self, fn, *args):
+        self._queue.put_nowait((fn, args))
+
+    def writerows(self, rows):
+        self.call(self._writer.writerows, rows)
+
+    def flush(self):
+        self.call(self._f.flush)
+
+    async def wait_for_room(self):
+        # returns once the backlog is down to max_backlog (or the output has failed)
+        while self._queue.qsize() > self.max_backlog and not self.failed:
+            self._room.clear()
+            await self._room.wait()
+
+    async def _drain(self):
+        while True:
+            fn, args = await self._queue.get()
+            try:
+                if not self.failed:
+                    job = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+                    try:
+                        await asyncio.shield(job)
+                    except asyncio.CancelledError:
+                        # a thread can't be interrupted: let its call finish with the output
+                        # before this task ends, so close() never overlaps it
+                        await asyncio.wait({job})
+                        if not job.cancelled() and job.exception() is not None:
+                            self.failed = True
+                            self.log.error("Error writing output, stopping: %s", job.exception())
+                        raise
+            except Exception as e:
+                self.failed = True
+                self.log.error("Error writing output, stopping: %s", e)
+            finally:
+                self._queue.task_done()
+                if self._queue.qsize() <= self.max_backlog or self.failed:
+                    self._room.set()
+
+    async def close(self):
+        # wait for everything queued; if the drain task is cancelled first (asyncio.run's
+        # shutdown cancels every task), apply what is left inline once it has stopped
+        join = asyncio.ensure_future(self._queue.join())
+        try:
+            await asyncio.wait({join, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            join.cancel()
+            self._task.cancel()
+            await asyncio.wait({self._task})
+            while not self._queue.empty():
+                fn, args = self._queue.get_nowait()
+                if self.failed:
+                    continue
+                try:
+                    fn(*args)
+                except Exception as e:
+                    self.failed = True
+                    self.log.error("Error writing output, stopping: %s", e)
+
+# =====================
+# Parquet output (optional, needs pyarrow)
+# =====================
+PARQUET_BATCH_ROWS = 100
+
+
+@functools.lru_cache(maxsize=1)
+def _pyarrow():
+    # pyarrow is slow to import, so only runs that write or resume parquet pay for it
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([
+        ('ID', pa.int64()),
+        ('Username', pa.string()),
+        ('Text', pa.string()),
+        ('Created At', pa.string()),
+        ('Retweets', pa.int64()),
+        ('Likes', pa.int64()),
+        ('Replies', pa.int64()),
+    ])
+    return pa, pq, schema
+
+
+class ParquetTweetWriter:
+    # Stands in for the csv file + csv.writer pair: rows are buffered and written as
+    # columnar record batches (snappy text, dictionary-encoded usernames), with no
+    # per-field CSV quoting. Each run adds one part file to the output directory.
+    def __init__(self, path: str):
+        self.path = path
+        self._writer = None  # opened on the first batch, so resumes that add nothing leave no empty part
+        self._rows = []
+
+    def writerows(self, rows):
+        self._rows.extend(rows)
+        if len(self._rows) >= PARQUET_BATCH_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        pa, pq, schema = _pyarrow()
+        if self._writer is None:
+            os.makedirs(self.path, exist_ok=True)
+            part = os.path.join(self.path, f'part-{time.time_ns()}.parquet')
+            self._writer = pq.ParquetWriter(part, schema, compression='snappy', use_dictionary=['Username'])
+        cols = list(zip(*self._rows))
+        cols[0] = [int(tid) for tid in cols[0]]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(cols, schema)],
+            schema=schema,
+        ))
+        self._rows.clear()
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parquet_existing_ids(path: str, log: logging.Logger = logger) -> IdIndex:
+    _, pq, _ = _pyarrow()
+
+    def part_ids():
+        # one part's ids at a time, so IdIndex packs them as they come
+        for name in sorted(os.listdir(path)):
+            try:
+                yield from pq.read_table(os.path.join(path, name), columns=['ID'])['ID'].to_pylist()
+            except Exception as e:
+                # a part left open by a crash has no footer; its rows are refetched
+                log.error("Error reading %s: %s", name, e)
+
+    return IdIndex(part_ids())
+
+# =====================
+# Rate limiting
+# =====================
+class RateLimiter:
+    # Paces searches from the x-rate-limit-* headers Twitter sends with every search
+    # response, so the budget is spread over the window instead of hitting 429s.
+    # Shared by every query in the process: the limit is per account, not per query.
+    def __init__(self):
+        self.remaining = None
+        self.reset = None
+        self.last_request = 0.0
+        self._lock = asyncio.Lock()
+
+    async def observe(self, response):
+        # httpx response hook; other endpoints have their own, unrelated limits
+        if 'SearchTimeline' not in response.url.path:
+            return
+        try:
+            self.remaining = int(response.headers['x-rate-limit-remaining'])
+            self.reset = int(response.headers['x-rate-limit-reset'])
+        except (KeyError, ValueError):
+            pass
+
+    def interval(self) -> float:
+        if self.remaining is None or self.reset is None:
+            return 0
+        return max(self.reset - time.time(), 0) / max(self.remaining, 1)
+
+    def pace(self, fallback) -> float:
+        # jittered gap that spends the remaining budget evenly over the window; a fixed
+        # random.randint(*fallback) until a search response has been seen
+        if self.remaining is None or self.reset is None:
+            return random.randint(*fallback)
+        gap = max(1, self.interval())
+        return gap + random.uniform(0, gap * 0.1)
+
+    def set_next_allowed(self, reset_time: float):
+        # after a 429: no budget left until reset_time (epoch seconds)
+        self.remaining = 0
+        self.reset = reset_time
+
+    async def acquire(self):
+        # no-op until the first search response has been seen
+        async with self._lock:
+            wait_time = self.last_request + self.interval() - time.time()
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+            self.last_request = time.time()
+
+
+rate_limiter = RateLimiter()
+
+
+class TokenBucket:
+    # Fixed-budget alternative to RateLimiter for callers that know their quota: a token is
+    # added every 1/rate seconds up to capacity and each search takes one, so acquire()
+    # waits only as long as the budget requires. A 429 empties the bucket until the reset.
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.not_before = 0.0
+
+    def set_next_allowed(self, reset_time: float):
+        # reset_time is the epoch second from x-rate-limit-reset
+        now = time.monotonic()
+        self.not_before = max(self.not_before, now + max(reset_time - time.time(), 0))
+        self.tokens = 0.0
+        self.updated = self.not_before
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.not_before:
+                await asyncio.sleep(self.not_before - now)
+                continue
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# =====================
+# Auth
+# =====================
+async def check_cookies_valid(client: Client, log: logging.Logger = logger) -> bool:
+    try:
+        await client.get_trends('trending')
+        return True
+    except Exception as e:
+        log.error("Cookie validation failed: %s", e)
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def read_config(config_file: str = CONFIG_FILE):
+    # parsed on first use, at most once per process: a run whose cookies are still valid
+    # (and that needs no proxy) never touches config.ini
+    from configparser import ConfigParser
+    config = ConfigParser()
+    config.read(config_file)
+    return config
+
+
+def account_proxy(config, section: str) -> str | None:
+    proxy_str = config[section].get('proxy', '').strip()
+    return None if proxy_str.lower() in ['none', 'no-proxy', ''] else proxy_str
+
+
+async def init_client(section: str = 'X', cookies_file: str = COOKIES_FILE, config_file: str = CONFIG_FILE,
+                      use_proxy: bool = False, login_attempts: int = 1, limits: httpx.Limits = HTTP_LIMITS,
+                      log: logging.Logger = logger) -> Client | None:
+    # cookies first; config.ini[section] is only needed for a login, or up front for its
+    # proxy since every request (the cookie check included) has to go through it.
+    # limits sizes the connection pool (callers with one request at a time need a tiny one).
+    proxy = None
+    if use_proxy:
+        config = read_config(config_file)
+        if section not in config:
+            log.error("Account '%s' not found in %s", section, config_file)
+            return None
+        proxy = account_proxy(config, section)
+
+    async def log_connection(response: httpx.Response):
+        # debug aid: 'keep-alive' (or no header on HTTP/1.1) means the connection stays pooled
+        log.debug("%s: %s connection=%s", response.request.url.path, response.http_version,
+                  response.headers.get('connection'))
+
+    client = Client(language='ar', proxy=proxy, limits=limits, http2=HTTP2,
+                    event_hooks={'response': [rate_limiter.observe, log_connection]})
+
+    if os.path.exists(cookies_file):
+        try:
+            client.load_cookies(cookies_file)
+            log.info('Loaded existing cookies')
+            if await check_cookies_valid(client, log):
+                log.info('Cookies are valid')
+                return client
+            else:
+                log.warning('Cookies expired — re-login required')
+        except Exception as e:
+            log.error("Error loading cookies: %s", e)
+
+    # only reached when the cookies are missing or expired
+    config = read_config(config_file)
+    try:
+        username = config[section]['username']
+        email = config[section]['email']
+        password = config[section]['password']
+    except KeyError as e:
+        log.error("Missing configuration: %s", e)
+        return None
+
+    for attempt in range(login_attempts):
+        try:
+            log.info('Logging in (attempt %d/%d)...', attempt + 1, login_attempts)
+            await client.login(auth_info_1=username, auth_info_2=email, password=password)
+            client.save_cookies(cookies_file)
+            log.info('Logged in & saved cookies')
+            return client
+        except Exception as e:
+            log.error("Login failed (attempt %d/%d): %s", attempt + 1, login_attempts, e)
+            if attempt < login_attempts - 1:
+                wait_time = RETRY_DELAYS[attempt]
+                log.info("Retrying login in %s seconds...", wait_time)
+                await asyncio.sleep(wait_time)
+    return None
+
+# =====================
+# Search with retries
+# =====================
+async def safe_search(client: Client, query: str, product: str = 'Latest', count: int = BATCH_SIZE, cursor=None,
+                      log: logging.Logger = logger, retries: int = MAX_RETRIES, limiter=None,
+                      sem: asyncio.Semaphore | None = None):
+    # limiter: the module's header-paced RateLimiter unless given (e.g. an account's own TokenBucket);
+    # sem: optional cap on searches in flight, held only for the request itself
+    limiter = limiter or rate_limiter
+    for attempt in range(retries):
+        await limiter.acquire()
+        delay = RETRY_DELAYS[min(attempt, len(RETRY_DELAYS) - 1)]
+        try:
+            if sem is None:
+                return await client.search_tweet(query, product, count=count, cursor=cursor)
+            async with sem:
+                return await client.search_tweet(query, product, count=count, cursor=cursor)
+        except TooManyRequests as e:
+            # Twitter tells us when to resume; back off instead if it doesn't
+            reset_time = getattr(e, 'rate_limit_reset', None)
+            if reset_time:
+                wait_time = max(reset_time - time.time(), 0) + 10
+                log.warning("Rate limited. Waiting %.0fs until %s", wait_time, datetime.fromtimestamp(reset_time))
+                # the next acquire() waits it out, for every search sharing the limiter
+                limiter.set_next_allowed(reset_time + 10)
+            else:
+                log.warning("Rate limited (no reset time). Waiting %ss", delay)
+                await asyncio.sleep(delay)
+        except Exception as e:
+            log.error("Search error (attempt %d/%d): %s", attempt + 1, retries, e)
+            if attempt < retries - 1:
+                await asyncio.sleep(delay)
+    log.error("All %d search attempts failed", retries)
+    return None
+
+# =====================
+# Collection loop
+# =====================
+class CursorRing:
+    # Loop protection for the pagination: remembers the last `maxlen` cursors as 64-bit
+    # fingerprints (a cursor is a ~100-byte base64 blob) in a ring, so memory stays bounded
+    # however long the run; the set mirrors the deque for O(1) membership.
+
+    def __init__(self, maxlen: int = SEEN_CURSORS_MAX):
+        self._ring = deque(maxlen=maxlen)
+        self._set = set()
+
+    def add(self, cursor: str) -> bool:
+        # False when the cursor was already seen
+        fp = xxh64_intdigest(cursor)
+        if fp in self._set:
+            return False
+        if len(self._ring) == self._ring.maxlen:
+            self._set.discard(self._ring[0])
+        self._ring.append(fp)
+        self._set.add(fp)
+        return True
+
+    def clear(self):
+        self._ring.clear()
+        self._set.clear()
+
+
+async def run(client: Client, query: str, out_path: str, ckpt_file: str, product: str = 'Latest',
+              max_tweets: int = 1000, *, fmt: str = 'csv', rotate: bool = False, batch_size: int = BATCH_SIZE,
+              max_failures: int = 20, max_stale_pages: int | None = None, pace=(30, 90),
+              pace_from_headers: bool = True, backoff=(30, 60), backoff_grows: bool = True,
+              retries: int = MAX_RETRIES, meta: dict | None = None, log: logging.Logger = logger) -> int:
+    # Collect up to max_tweets for query into out_path, resuming from ckpt_file, and
+    # return the running total. A product's stream ends on an empty page, a missing or
+    # repeated cursor; with rotate=True the next of PRODUCTS takes over (until they have
+    # all run dry in a row), otherwise the run stops. A failed search keeps the cursor
+    # and is retried from the same page, up to max_failures times in a row.
+    # max_stale_pages stops after that many pages in a row with nothing new.
+    # Between searches it waits rate_limiter.pace(pace), or randint(*pace) seconds with
+    # pace_from_headers=False; after a failure randint(*backoff) seconds instead, times
+    # the consecutive failures unless backoff_grows=False.
+    # meta is extra, informational checkpoint content (e.g. the day of a daily run).
+    qhash = query_hash(query)
+    default = {'count': 0, 'cursor': None, 'product': product}
+    ckpt = load_checkpoint(ckpt_file, default, log)
+    if ckpt.get('query_hash', qhash) != qhash:
+        log.info('Checkpoint belongs to a different query — starting fresh')
+        ckpt = dict(default)
+    collected = ckpt.get('count', 0)
+    cursor = ckpt.get('cursor')
+    if rotate:
+        product = ckpt.get('product') or product
+    elif ckpt.get('product', product) != product:
+        cursor = None  # that cursor pages another product's results
+    resumed = cursor is not None
+    last_success = ckpt.get('last_success_time')
+    if meta:
+        ckpt.update(meta)
+
+    existing_ids = init_existing_ids(out_path, log)
+
+    f, writer = open_output(out_path, fmt)
+    with f:
+        out = QueuedWriter(f, writer, log)
+        failures = 0
+        stale_pages = 0
+        dry_products = 0
+        seen_cursors = CursorRing()
+        since_ckpt = 0
+        since_flush = 0
+
+        try:
+            while collected < max_tweets and failures < max_failures:
+                await out.wait_for_room()
+                if out.failed:
+                    break  # a queued write failed: stop before anything else is counted
+                log.info("Collected %d/%d — product=%s — cursor=%s", collected, max_tweets, product, cursor)
+
+                result = await safe_search(client, query, product, batch_size, cursor, log, retries)
+                if result is None:
+                    failures += 1
+                    log.warning("Search failed (%d/%d)", failures, max_failures)
+                    # keep cursor; try again from same spot
+                else:
+                    failures = 0
+                    tweets = list(result)
+                    if not tweets and resumed:
+                        # the checkpointed cursor went stale (expired, or its tweets were
+                        # deleted): recover once from the first page rather than stop here
+                        log.info('Checkpointed cursor returned nothing — restarting from the first page')
+                        cursor = None
+                        resumed = False
+                        continue
+                    resumed = False
+                    next_cursor = None
+                    if tweets:
+                        added = save_tweets_batch(tweets, out, existing_ids, log)
+                        collected += added
+                        last_success = datetime.now().isoformat()
+                        log.info("Added %d new. Total=%d", added, collected)
+                        if added:
+                            stale_pages = dry_products = 0
+                        else:
+                            stale_pages += 1
+
+                        since_flush += 1
+                        if since_flush >= FLUSH_EVERY:
+                            out.flush()
+                            since_flush = 0
+
+                        next_cursor = result.next_cursor
+                        if next_cursor and not seen_cursors.add(next_cursor):
+                            log.info('Cursor repeated; treating it as the end of the results.')
+                            next_cursor = None
+
+                    # a fresh run (or the next product) starts again from the newest
+                    cursor = next_cursor
+                    if not cursor:
+                        dry_products += 1
+                        if not rotate or dry_products >= len(PRODUCTS):
+                            log.info('No more pages — stopping.')
+                            break
+                        product = PRODUCTS[(PRODUCTS.index(product) + 1) % len(PRODUCTS)] if product in PRODUCTS else PRODUCTS[0]
+                        seen_cursors.clear()
+                        log.info("No more pages — switching to product=%s", product)
+
+                    if max_stale_pages is not None and stale_pages >= max_stale_pages:
+                        log.info("No new unique tweets in %d consecutive pages — stopping.", stale_pages)
+                        break
+
+                # Save ckpt every CHECKPOINT_EVERY iterations (and on exit, below)
+                since_ckpt += 1
+                if since_ckpt >= CHECKPOINT_EVERY:
+                    out.flush()  # queued first: never checkpoint past rows still sitting in the buffer
+                    ckpt.update({'query_hash': qhash, 'count': collected, 'cursor': cursor, 'product': product,
+                                 'last_success_time': last_success})
+                    out.call(save_checkpoint, ckpt_file, dict(ckpt), log)
+                    since_ckpt = 0
+
+                if failures:
+                    delay = random.randint(*backoff) * (failures if backoff_grows else 1)
+                elif pace_from_headers:
+                    delay = rate_limiter.pace(pace)
+                else:
+                    delay = random.randint(*pace)
+                log.info("Waiting %.0fs before next request…", delay)
+                await asyncio.sleep(delay)
+        finally:
+            out.flush()
+            if fmt == 'csv':
+                out.call(save_ids_cache, existing_ids, out_path)
+            ckpt.update({'query_hash': qhash, 'count': collected, 'cursor': cursor, 'product': product,
+                         'last_success_time': last_success})
+            out.call(save_checkpoint, ckpt_file, dict(ckpt), log)
+            await out.close()
+
+    if out.failed:
+        collected = load_checkpoint(ckpt_file, default, log).get('count', 0)  # the pages that did reach the disk
+        log.error('Stopped: writing the output failed; resuming from the last checkpoint refetches the lost rows')
+    elif failures >= max_failures:
+        log.warning("Stopped: %d consecutive failures", failures)
+    log.info("Done. Collected %d tweets.", collected)
+    return collected
+
+
+def run_main(coro):
+    # script entry point: asyncio.run on uvloop when it is installed
+    try:
+        import uvloop  # libuv-based loop: cheaper task switches and socket reads
+        uvloop.install()
+    except ImportError:
+        pass
+    return asyncio.run(coro)